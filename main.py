@@ -1,9 +1,15 @@
+import io
 import re
 import random
 import json
+import os
+import shutil
 import time
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Optional, Tuple, List  # <-- 1. 导入 List
+from typing import Dict, Optional, Tuple, List, Set  # <-- 1. 导入 List
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.message_components import Plain, Image, At
 from astrbot.api.event import MessageChain
@@ -15,171 +21,539 @@ import numpy as np
 import asyncio
 import platform
 
+try:
+    from numba import njit
+    _NUMBA_AVAILABLE = True
+except ImportError:  # 未安装 numba 时退化为纯 Python 执行，逻辑不变，仅速度变慢
+    _NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+_DIRECTIONS = ((1, 0), (0, 1), (1, 1), (1, -1))
+_HELP_TEXT = (
+    "🎲 五子棋游戏帮助（完整功能版） 🎲\n\n"
+    "【核心指令】\n"
+    "- /五子棋: 创建新游戏，并发布到游戏大厅。\n"
+    "- /取消五子棋: 游戏未开始时，发起者可取消游戏。\n"
+    "- /游戏大厅: 查看所有等待中的游戏。\n"
+    "- /加入五子棋 <ID>: 输入ID加入游戏。\n"
+    "- /人机对战: 直接开始或加入人机对战。\n"
+    "- 直接发坐标(如H7): 在指定位置落子。\n\n"
+    "【游戏内指令】\n"
+    "- /查看棋局: 查看当前棋盘。\n"
+    "- /悔棋, /接受悔棋, /拒绝悔棋\n"
+    "- /求和, /接受求和, /拒绝求和\n"
+    "- /认输: 结束游戏并判负。\n"
+    "- /结束下棋: [仅限人机对战] 放弃对局（无胜负记录）。\n\n"
+    "【其他】\n"
+    "- /我的战绩: 查询战绩。\n"
+    "- /五子棋排行榜: 查看排行榜"
+)
+# 直接发送坐标落子的消息格式（15 路棋盘），注册时由框架编译一次
+_MOVE_PATTERN = r'^[A-Oa-o](1[0-5]|[1-9])$'
+# 排行榜快照中记录已并入快照的最后一条日志序号的保留键，加载时取出，不作为玩家条目
+_RANK_SEQ_KEY = "__journal_seq__"
+# 按玩家编号索引的执子称呼，1 为黑棋、2 为白棋
+_STONE_LABELS = ("", "黑棋", "白棋")
+_AI_INF = 1 << 30
+_AI_WIN_SCORE = 1000000
+# 棋型权重 (成五, 成四或双活三, 每个活三)：己方进攻与阻挡对方共用同一套计分
+_OWN_SHAPE_WEIGHTS = (100000, 10000, 1000)
+_OPP_SHAPE_WEIGHTS = (50000, 5000, 500)
+# 迭代加深的最大深度；纯 Python 下深层搜索过慢，退化为与旧版一致的单层贪心
+_AI_SEARCH_DEPTH = 4 if _NUMBA_AVAILABLE else 1
+# 置换表条目类型：精确值 / 下界（发生了 beta 剪枝）/ 上界（没有着法超过 alpha）
+_TT_EXACT, _TT_LOWER, _TT_UPPER = 0, 1, 2
+_AI_TT_SIZE = 1 << 17  # 置换表槽位数，须为 2 的幂
+# 每加深一层搜索耗时增长倍数的初始估计；之后改用实测的相邻两层耗时之比
+_AI_DEPTH_GROWTH = 30
+
+
+@njit("boolean(int8[:, ::1], int64, int64, int64)", cache=True, nogil=True)
+def _check_win_inc(board, x, y, player):
+    """只扫描经过最后一手 (x, y) 的四个方向，判断是否连成五子"""
+    n = board.shape[0]
+    for dx, dy in _DIRECTIONS:
+        count = 1
+        for i in range(1, 5):
+            nx, ny = x + i * dx, y + i * dy
+            if 0 <= nx < n and 0 <= ny < n and board[nx, ny] == player:
+                count += 1
+            else:
+                break
+        for i in range(1, 5):
+            nx, ny = x - i * dx, y - i * dy
+            if 0 <= nx < n and 0 <= ny < n and board[nx, ny] == player:
+                count += 1
+            else:
+                break
+        if count >= 5:
+            return True
+    return False
+
+
+@njit("Tuple((int64, boolean, int64, boolean))(int8[:, ::1], int64, int64, int64, int64, int64)", cache=True, nogil=True, fastmath=True)
+def _scan_half_nb(board, x, y, dx, dy, player):
+    """沿 (dx, dy) 单向扫描一次，同时得到己方与对方从 (x, y) 延伸出的连子数及其末端是否为空位"""
+    n = board.shape[0]
+    nx, ny = x + dx, y + dy
+    if not (0 <= nx < n and 0 <= ny < n): return 0, False, 0, False
+    first = board[nx, ny]
+    if first == 0: return 0, True, 0, True
+    run, is_open = 1, False
+    for i in range(2, 5):
+        nx, ny = x + i * dx, y + i * dy
+        if 0 <= nx < n and 0 <= ny < n and board[nx, ny] == first:
+            run += 1
+        else:
+            is_open = 0 <= nx < n and 0 <= ny < n and board[nx, ny] == 0
+            break
+    # 紧邻的是哪一方，就只有哪一方能延伸；另一方长度为 0 且末端被堵
+    if first == player: return run, is_open, 0, False
+    return 0, False, run, is_open
+
+
+@njit("UniTuple(int64, 3)(int64, boolean, int64, boolean)", cache=True, nogil=True)
+def _line_shape(run_f, open_f, run_b, open_b):
+    """按 (x, y) 两侧的连子数与末端空位判断棋型，返回 (成五, 成四, 活三) 的 0/1 标记"""
+    count = 1 + run_f + run_b
+    return int(count >= 5), int(count == 4), int(count == 3 and open_f and open_b)
+
+
+@njit("int64(int64, int64, int64, UniTuple(int64, 3))", cache=True, nogil=True)
+def _shape_score(fives, fours, threes, weights):
+    """按权重表 (成五, 成四或双活三, 每个活三) 计分"""
+    score = fives * weights[0] + threes * weights[2]
+    if fours > 0 or threes > 1: score += weights[1]
+    return score
+
+
+@njit("int64(int8[:, ::1], int64, int64, int64)", cache=True, nogil=True, fastmath=True)
+def _evaluate_position_nb(board, x, y, player):
+    """评估在 (x, y) 落子的分数；每个方向正反各扫描一次，同时统计己方进攻与对方威胁，不修改棋盘"""
+    n = board.shape[0]
+    fives, fours, threes = 0, 0, 0
+    opp_fives, opp_fours, opp_threes = 0, 0, 0
+    for dx, dy in _DIRECTIONS:
+        own_f, own_open_f, opp_f, opp_open_f = _scan_half_nb(board, x, y, dx, dy, player)
+        own_b, own_open_b, opp_b, opp_open_b = _scan_half_nb(board, x, y, -dx, -dy, player)
+        a, b, c = _line_shape(own_f, own_open_f, own_b, own_open_b)
+        fives, fours, threes = fives + a, fours + b, threes + c
+        a, b, c = _line_shape(opp_f, opp_open_f, opp_b, opp_open_b)
+        opp_fives, opp_fours, opp_threes = opp_fives + a, opp_fours + b, opp_threes + c
+    # 己方成五或成四/双活三时直接取该档分数，不再叠加防守分
+    if fives > 0: return _OWN_SHAPE_WEIGHTS[0]
+    if fours > 0 or threes > 1: return _OWN_SHAPE_WEIGHTS[1]
+    score = _shape_score(0, 0, threes, _OWN_SHAPE_WEIGHTS)
+    score += _shape_score(opp_fives, opp_fours, opp_threes, _OPP_SHAPE_WEIGHTS)
+    return score + (n - (abs(x - n // 2) + abs(y - n // 2)))
+
+
+@njit("void(int8[:, ::1], int64, int64, int64)", cache=True, nogil=True)
+def _update_candidates(cand, x, y, delta):
+    """cand[i, j] 记录半径 2 以内的棋子数，大于 0 的空位即为候选点"""
+    n = cand.shape[0]
+    for i in range(max(0, x - 2), min(n, x + 3)):
+        for j in range(max(0, y - 2), min(n, y + 3)):
+            cand[i, j] += delta
+
+
+@njit("int8[:, ::1](int8[:, ::1])", cache=True, nogil=True)
+def _build_candidates(board):
+    n = board.shape[0]
+    cand = np.zeros((n, n), dtype=np.int8)
+    for i in range(n):
+        for j in range(n):
+            if board[i, j] != 0:
+                _update_candidates(cand, i, j, 1)
+    return cand
+
+
+@njit("Tuple((int64[::1], int64[::1], int64[::1]))(int8[:, ::1], int8[:, ::1], int64, int64, int64)", cache=True, nogil=True)
+def _ordered_moves(board, cand, player, last_x, last_y):
+    """收集候选点并算出单步评估分，按分数由高到低排序以尽早剪枝，同分时离上一手近的优先"""
+    n = board.shape[0]
+    xs = np.empty(n * n, dtype=np.int64)
+    ys = np.empty(n * n, dtype=np.int64)
+    scores = np.empty(n * n, dtype=np.int64)
+    keys = np.empty(n * n, dtype=np.int64)
+    k = 0
+    for i in range(n):
+        for j in range(n):
+            if board[i, j] == 0 and cand[i, j] > 0:
+                xs[k], ys[k] = i, j
+                scores[k] = _evaluate_position_nb(board, i, j, player)
+                keys[k] = -scores[k] * 16 + max(abs(i - last_x), abs(j - last_y))
+                k += 1
+    order = np.argsort(keys[:k], kind="mergesort")
+    return xs[order], ys[order], scores[order]
+
+
+@njit("Tuple((int64, int64, int64))(int8[:, ::1], int8[:, ::1], int64[:, :, ::1], int64[::1], int64[:, ::1], "
+      "int64, int64, int64, int64, int64, int64, int64)", cache=True, nogil=True)
+def _alphabeta(board, cand, zobrist, tt_keys, tt_vals, h, depth, alpha, beta, player, last_x, last_y):
+    """负极大值形式的 alpha-beta 搜索，带 Zobrist 置换表。
+
+    每一手的收益沿用单步评估分，局面分为双方收益之差；返回 (分数, 最佳行, 最佳列)，
+    分数以 player 视角计算。h 为当前局面的 Zobrist 哈希，置换表 tt_vals 每行为
+    (分数, 深度, 类型, 最佳着法)。搜索过程中原地落子并还原，board 与 cand 调用前后不变。
+    """
+    n = board.shape[0]
+    key = h if player == 1 else ~h  # 轮到哪一方也是局面的一部分
+    slot = key & (tt_keys.shape[0] - 1)
+    tt_move = -1
+    if tt_keys[slot] == key:
+        tt_score, tt_depth, tt_flag, tt_move = tt_vals[slot, 0], tt_vals[slot, 1], tt_vals[slot, 2], tt_vals[slot, 3]
+        if tt_depth >= depth and tt_move >= 0:
+            if tt_flag == _TT_EXACT: return tt_score, tt_move // n, tt_move % n
+            if tt_flag == _TT_LOWER and tt_score > alpha: alpha = tt_score
+            if tt_flag == _TT_UPPER and tt_score < beta: beta = tt_score
+            if alpha >= beta: return tt_score, tt_move // n, tt_move % n
+    alpha_orig = alpha
+    xs, ys, scores = _ordered_moves(board, cand, player, last_x, last_y)
+    if tt_move >= 0:
+        # 置换表记录的最佳着法最可能引发剪枝，提到最前面先搜
+        for k in range(xs.shape[0]):
+            if xs[k] * n + ys[k] == tt_move:
+                xs[0], xs[k], ys[0], ys[k], scores[0], scores[k] = xs[k], xs[0], ys[k], ys[0], scores[k], scores[0]
+                break
+    best, best_x, best_y = -_AI_INF, -1, -1
+    for k in range(xs.shape[0]):
+        x, y, score = xs[k], ys[k], scores[k]
+        board[x, y] = player
+        if _check_win_inc(board, x, y, player):
+            board[x, y] = 0
+            return _AI_WIN_SCORE + depth, x, y
+        if depth > 1:
+            _update_candidates(cand, x, y, 1)
+            reply, _, _ = _alphabeta(board, cand, zobrist, tt_keys, tt_vals, h ^ zobrist[x, y, player], depth - 1,
+                                     score - beta, score - alpha, 3 - player, x, y)
+            score -= reply
+            _update_candidates(cand, x, y, -1)
+        board[x, y] = 0
+        if score > best:
+            best, best_x, best_y = score, x, y
+        if best > alpha:
+            alpha = best
+        if alpha >= beta:
+            break
+    if best_x < 0:
+        return 0, -1, -1
+    tt_keys[slot] = key
+    tt_vals[slot, 0], tt_vals[slot, 1], tt_vals[slot, 3] = best, depth, best_x * n + best_y
+    if best <= alpha_orig:
+        tt_vals[slot, 2] = _TT_UPPER
+    elif best >= beta:
+        tt_vals[slot, 2] = _TT_LOWER
+    else:
+        tt_vals[slot, 2] = _TT_EXACT
+    return best, best_x, best_y
+
+
+@dataclass(slots=True)
+class Game:
+    """一局对局的全部状态；使用 __slots__ 的数据类，字段访问比字典查找更省"""
+    id: str
+    board: np.ndarray
+    players: Dict[int, Optional[dict]]  # 1 黑 / 2 白，等待加入时 2 号为 None
+    status: str  # pending / active / finished
+    roles: Dict[str, int]  # 玩家 id 到执子序号的映射，随入座维护
+    history: deque  # 按落子顺序记录压缩后的着法，一局最多 board_size² 手
+    candidates: np.ndarray  # [i, j] 为半径 2 内的棋子数，随落子增量维护，供 AI 只搜索棋子附近的空位
+    current_player: int = 1
+    last_move: Optional[Tuple[int, int]] = None
+    moves_played: int = 0
+    # bitboards[玩家] 以 Python 整数按位记录该玩家的棋子，作为胜负判断的依据，0 号不使用
+    bitboards: List[int] = field(default_factory=lambda: [0, 0, 0])
+    zhash: int = 0  # 当前局面的 Zobrist 哈希，落子/悔棋时增量异或
+
+
+@dataclass(slots=True)
+class PendingRequest:
+    """等待对方回应的悔棋/求和请求"""
+    proposer: str  # 发起者 id
+    proposer_num: int  # 发起者的执子序号
+    timeout_handle: asyncio.TimerHandle  # 到期回调，请求被处理时取消
+
 
 @register("astrbot_plugin_wuziqi", "大沙北/DITF16(改)", "五子棋游戏（全局匹配重构版）", "2.0.0",
           "https://github.com/bigshabei/astrbot_plugin_wuziqi")
 class WuziqiPlugin(Star):
     def __init__(self, context: Context, config: AstrBotConfig = None):
         super().__init__(context)
-        self.games: Dict[str, dict] = {}
+        self.games: Dict[str, Game] = {}
         self.player_to_game: Dict[str, str] = {}
         # 新增游戏大厅列表
         self.lobby: List[Dict[str, str]] = []
         self.board_size = config.get('board_size', 15) if config else 15
         self.join_timeout = config.get('join_timeout', 300) if config else 300
         self.request_timeout_duration = 30  # 悔棋/求和请求的超时时间
+        self.ai_time_budget = config.get('ai_time_budget', 1.0) if config else 1.0
+        # 位棋盘行宽取 board_size + 1，多出的一列恒为空，横向与斜向移位时不会跨行误连
+        self._bb_stride = self.board_size + 1
+        self._bb_shifts = (1, self._bb_stride, self._bb_stride + 1, self._bb_stride - 1)
+        # 每个方向上连续 9 格（以落子为中心前后各 4 格）的位掩码，胜负判断只看经过落子的这一段
+        self._bb_lines = tuple(sum(1 << (k * d) for k in range(9)) for d in self._bb_shifts)
+        self._last_row = chr(64 + self.board_size)  # 最后一行的字母，15 路棋盘为 O
         self.backup_interval = config.get('backup_interval', 3600) if config else 3600
         self.data_path = StarTools.get_data_dir("astrbot_plugin_wuziqi")
         self.data_path.mkdir(parents=True, exist_ok=True)
         self.rank_file = self.data_path / "rankings.json"
         self.rank_backup_file = self.data_path / "rankings_backup.json"
+        # 战绩变动以每行一条记录追加到日志，快照只在日志过长、定期备份或卸载时整体重写
+        self.rank_journal_file = self.data_path / "rankings.jsonl"
+        self.rank_compact_threshold = 500  # 日志超过该行数时压缩进快照
+        self._rank_journal_buf: List[str] = []
+        self._rank_journal_lines = 0
+        self._rank_journal_seq = 0  # 最后一条日志记录的序号，单调递增
         self.rankings: Dict[str, Dict[str, int]] = self._load_rankings()
+        # 快照是否落后于内存；排行榜每次变动版本号加一，出图结果按版本号缓存
+        self._rankings_dirty = self._rank_journal_lines > 0
+        self._rankings_version = 0
+        self._rankings_image: Optional[Tuple[int, bytes]] = None
         self.last_backup_time = 0
+        self.rank_save_delay = 2  # 排行榜写盘的合并窗口（秒）
+        self._save_task: Optional[asyncio.Task] = None
         self.font_path = Path(__file__).parent / "msyh.ttf"
+        # 字体按字号缓存，预先加载绘图用到的 20 / 24 号，首次出图不再读取字体文件
+        self._font_cache: Dict[int, ImageFont.FreeTypeFont] = {}
+        for size in (20, 24): self._get_system_font(size)
+        # 星位：距边 3 路（小棋盘为 2 路）的四角与天元，15 路即 D4/L4/D12/L12/H8
+        edge = 3 if self.board_size >= 13 else 2
+        far, center = self.board_size - 1 - edge, self.board_size // 2
+        self._star_points = ((edge, edge), (far, edge), (edge, far), (far, far), (center, center))
+        self._board_template = self._build_board_template()
+        self._stone_sprites = self._build_stone_sprites()
+        # 棋盘图片按局面 (棋盘内容 + 最后一手) 做 LRU 缓存，开局空盘、悔棋回到的局面等可直接复用
+        self._board_image_cache: OrderedDict = OrderedDict()
+        self.board_image_cache_size = 32
         self.wait_tasks: Dict[str, asyncio.Task] = {}
-        self.peace_requests: Dict[str, dict] = {}
-        self.undo_requests: Dict[str, dict] = {}
-        self.undo_stats: Dict[str, Dict[str, dict]] = {}
+        self._send_tasks: Set[asyncio.Task] = set()  # 后台发送中的主动消息，保留引用以免被回收
+        self.send_drain_timeout = 5  # 卸载时等待已排队消息发完的最长秒数
+        self.peace_requests: Dict[str, PendingRequest] = {}
+        self.undo_requests: Dict[str, PendingRequest] = {}
+        # Zobrist 随机数 [行, 列, 玩家] 与全局共享的置换表；表项只依赖局面本身，可跨回合、跨对局复用
+        n = self.board_size
+        self._zobrist = np.random.default_rng(0xC0FFEE).integers(1, 1 << 62, (n, n, 3), dtype=np.int64)
+        self._tt_keys = np.zeros(_AI_TT_SIZE, dtype=np.int64)
+        self._tt_vals = np.zeros((_AI_TT_SIZE, 4), dtype=np.int64)
+        # 搜索内核释放 GIL；各局 AI 搜索统一交给单线程执行器排队，置换表因此天然串行访问，
+        # 也不会占满默认线程池而拖慢其他对局的绘图
+        self._ai_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wuziqi-ai")
+        self._warmup_ai()
         logger.info("简易五子棋游戏（全局匹配重构版）已加载。")
 
     def _load_rankings(self) -> Dict[str, Dict[str, int]]:
+        rankings: Dict[str, Dict[str, int]] = {}
         if self.rank_file.exists():
             try:
                 with open(self.rank_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    rankings = json.load(f)
             except Exception as e:
                 logger.error(f"加载排行榜数据时出错: {e}")
                 return {}
-        return {}
+        snapshot_seq = self._rank_journal_seq = rankings.pop(_RANK_SEQ_KEY, 0)
+        if self.rank_journal_file.exists():
+            # 在快照之上重放增量日志；进程崩溃可能留下半行记录，跳过并补上换行，免得与后续追加的记录粘连。
+            # 若压缩时快照已替换而日志尚未清空就崩溃，日志中序号不超过快照序号的记录已计入快照，需跳过
+            try:
+                line = "\n"
+                with open(self.rank_journal_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        self._rank_journal_lines += 1
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        seq = record.get("seq")
+                        if seq is not None:
+                            if seq <= snapshot_seq: continue
+                            self._rank_journal_seq = max(self._rank_journal_seq, seq)
+                        data = rankings.setdefault(record["id"], {"name": record["name"], "wins": 0, "losses": 0, "draws": 0})
+                        data[record["field"]] += 1
+                if not line.endswith("\n"):
+                    with open(self.rank_journal_file, 'a', encoding='utf-8') as f: f.write("\n")
+            except Exception as e:
+                logger.error(f"重放排行榜日志时出错: {e}")
+        for data in rankings.values(): self._refresh_totals(data)
+        return rankings
 
-    def _save_rankings(self):
+    def _save_rankings(self, compact: bool = False):
+        """把缓冲的战绩记录追加到日志，日志过长或到备份时间时压缩为快照"""
         try:
-            with open(self.rank_file, 'w', encoding='utf-8') as f:
-                json.dump(self.rankings, f, ensure_ascii=False, indent=2)
+            if self._rank_journal_buf:
+                with open(self.rank_journal_file, 'a', encoding='utf-8') as f:
+                    f.writelines(self._rank_journal_buf)
+                self._rank_journal_lines += len(self._rank_journal_buf)
+                self._rank_journal_buf.clear()
             current_time = int(time.time())
-            if current_time - self.last_backup_time >= self.backup_interval:
+            backup_due = current_time - self.last_backup_time >= self.backup_interval
+            if compact or backup_due or self._rank_journal_lines >= self.rank_compact_threshold:
+                self._compact_rankings()
+            if backup_due:
                 self._backup_rankings()
                 self.last_backup_time = current_time
         except Exception as e:
             logger.error(f"保存排行榜数据时出错: {e}")
 
+    def _compact_rankings(self):
+        if not self._rankings_dirty: return
+        # 先写临时文件再原子替换，写入中途崩溃也不会留下半截的排行榜文件；快照落盘后再清空日志。
+        # 快照带上已并入的最后日志序号，替换与清空之间崩溃时重启不会重复计入日志
+        tmp_file = self.rank_file.with_suffix(".json.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({**self.rankings, _RANK_SEQ_KEY: self._rank_journal_seq}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_file, self.rank_file)
+        open(self.rank_journal_file, 'w', encoding='utf-8').close()
+        self._rank_journal_lines = 0
+        self._rankings_dirty = False
+
     def _backup_rankings(self):
         try:
-            with open(self.rank_backup_file, 'w', encoding='utf-8') as f:
-                json.dump(self.rankings, f, ensure_ascii=False, indent=2)
+            # 快照刚压缩完毕，直接复制即可，无需再次序列化；从未有过战绩时没有快照可备份
+            if not self.rank_file.exists(): return
+            shutil.copyfile(self.rank_file, self.rank_backup_file)
             logger.info(f"排行榜数据已备份到 {self.rank_backup_file}")
         except Exception as e:
             logger.error(f"备份排行榜数据时出错: {e}")
 
+    def _bump_ranking(self, player_id: str, player_name: str, field: str):
+        if player_id == "AI": return
+        data = self.rankings.setdefault(player_id, {"name": player_name, "wins": 0, "losses": 0, "draws": 0})
+        data[field] += 1
+        self._refresh_totals(data)
+        self._rank_journal_seq += 1
+        record = {"seq": self._rank_journal_seq, "id": player_id, "name": player_name, "field": field}
+        self._rank_journal_buf.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+        self._rankings_dirty = True
+        self._rankings_version += 1
+
+    def _refresh_totals(self, data: Dict[str, int]):
+        """总局数与胜率随战绩变动时一并算好，查询战绩和绘制排行榜时直接读取"""
+        wins, losses, draws = data.get("wins", 0), data.get("losses", 0), data.get("draws", 0)
+        data["total"] = total = wins + losses + draws
+        data["win_rate"] = (wins / total * 100) if total > 0 else 0
+
     def _update_rankings(self, winner_id: str, winner_name: str, loser_id: str, loser_name: str):
-        if winner_id != "AI":
-            if winner_id not in self.rankings: self.rankings[winner_id] = {"name": winner_name, "wins": 0, "losses": 0,
-                                                                           "draws": 0}
-            self.rankings[winner_id]["wins"] += 1
-        if loser_id != "AI":
-            if loser_id not in self.rankings: self.rankings[loser_id] = {"name": loser_name, "wins": 0, "losses": 0,
-                                                                         "draws": 0}
-            self.rankings[loser_id]["losses"] += 1
-        self._save_rankings()
+        self._bump_ranking(winner_id, winner_name, "wins")
+        self._bump_ranking(loser_id, loser_name, "losses")
+        self._schedule_save_rankings()
 
     def _update_draw_rankings(self, player1_id: str, player1_name: str, player2_id: str, player2_name: str):
-        if player1_id != "AI":
-            if player1_id not in self.rankings: self.rankings[player1_id] = {"name": player1_name, "wins": 0,
-                                                                             "losses": 0, "draws": 0}
-            self.rankings[player1_id]["draws"] += 1
-        if player2_id != "AI":
-            if player2_id not in self.rankings: self.rankings[player2_id] = {"name": player2_name, "wins": 0,
-                                                                             "losses": 0, "draws": 0}
-            self.rankings[player2_id]["draws"] += 1
-        self._save_rankings()
+        self._bump_ranking(player1_id, player1_name, "draws")
+        self._bump_ranking(player2_id, player2_name, "draws")
+        self._schedule_save_rankings()
+
+    def _schedule_save_rankings(self):
+        """延迟保存排行榜，窗口期内的多次更新合并为一次写盘"""
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._debounced_save_rankings())
 
+    async def _debounced_save_rankings(self):
+        await asyncio.sleep(self.rank_save_delay)
+        self._save_rankings()
 
     def _init_board(self) -> np.ndarray:
-        return np.zeros((self.board_size, self.board_size), dtype=int)
+        # 棋盘只存 0/1/2，使用 C 连续的 int8 数组，可直接传入 JIT 内核而无需转换
+        board = np.zeros((self.board_size, self.board_size), dtype=np.int8, order='C')
+        logger.debug(f"初始化棋盘: dtype={board.dtype}, C 连续={board.flags.c_contiguous}")
+        return board
+
+    def _place_stone(self, game: Game, x: int, y: int, player: int):
+        game.board[x, y] = player
+        game.bitboards[player] |= 1 << (x * self._bb_stride + y)
+        game.zhash ^= int(self._zobrist[x, y, player])
+        _update_candidates(game.candidates, x, y, 1)
+        game.moves_played += 1
+
+    def _remove_stone(self, game: Game, x: int, y: int, player: int):
+        """_place_stone 的逆操作，悔棋时逐手撤回"""
+        game.board[x, y] = 0
+        game.bitboards[player] &= ~(1 << (x * self._bb_stride + y))
+        game.zhash ^= int(self._zobrist[x, y, player])
+        _update_candidates(game.candidates, x, y, -1)
+        game.moves_played -= 1
+
+    def _pack_move(self, player: int, row: int, col: int) -> int:
+        """落子记录压缩为一个整数：高位为玩家，低 16 位为格子序号 row * board_size + col"""
+        return (player << 16) | (row * self.board_size + col)
+
+    def _unpack_move(self, move: int) -> Tuple[int, int, int]:
+        row, col = divmod(move & 0xFFFF, self.board_size)
+        return move >> 16, row, col
+
+    def _undo_moves(self, game: Game, count: int):
+        history, unpack, remove = game.history, self._unpack_move, self._remove_stone
+        for _ in range(count):
+            player, row, col = unpack(history.pop())
+            remove(game, row, col, player)
+        game.last_move = unpack(history[-1])[1:] if history else None
 
     def _is_valid_move(self, board: np.ndarray, x: int, y: int) -> bool:
         return 0 <= x < self.board_size and 0 <= y < self.board_size and board[x, y] == 0
 
-    def _check_win(self, board: np.ndarray, x: int, y: int, player: int) -> bool:
-        directions = [(1, 0), (0, 1), (1, 1), (1, -1)]
-        for dx, dy in directions:
-            count = 1
-            for i in range(1, 5):
-                nx, ny = x + i * dx, y + i * dy
-                if 0 <= nx < self.board_size and 0 <= ny < self.board_size and board[nx, ny] == player:
-                    count += 1
-                else:
-                    break
-            for i in range(1, 5):
-                nx, ny = x - i * dx, y - i * dy
-                if 0 <= nx < self.board_size and 0 <= ny < self.board_size and board[nx, ny] == player:
-                    count += 1
-                else:
-                    break
-            if count >= 5: return True
+    def _check_win(self, game: Game, x: int, y: int, player: int) -> bool:
+        # 先截取经过 (x, y) 的 9 格线段，再移位相与：m 先得到两连、再得到四连的起点，与再错开 4 步的棋子相与即为五连
+        stones, pos = game.bitboards[player], x * self._bb_stride + y
+        for d, line in zip(self._bb_shifts, self._bb_lines):
+            start = pos - 4 * d
+            seg = (stones >> start if start >= 0 else stones << -start) & line
+            m = seg & (seg >> d)
+            m &= m >> (2 * d)
+            if m & (seg >> (4 * d)): return True
         return False
 
-    def _check_draw(self, board: np.ndarray) -> bool:
-        return np.all(board != 0)
+    def _check_draw(self, game: Game) -> bool:
+        return game.moves_played >= self.board_size * self.board_size
 
-    def _count_line(self, board: np.ndarray, x: int, y: int, dx: int, dy: int, player: int) -> Tuple[int, bool]:
-        count = 0
-        open_ends = 0
-        for i in range(1 - 5, 5):
-            nx, ny = x + i * dx, y + i * dy
-            if not (0 <= nx < self.board_size and 0 <= ny < self.board_size): continue
-            if board[nx, ny] == player:
-                count += 1
-            elif board[nx, ny] == 0:
-                # 检查边界是否为该玩家棋子，以确定是否为开放端
-                if i > 0 and 0 <= x + (i - 1) * dx < self.board_size and 0 <= y + (i - 1) * dy < self.board_size and \
-                        board[x + (i - 1) * dx, y + (i - 1) * dy] == player:
-                    open_ends += 1
-                elif i < 0 and 0 <= x + (i + 1) * dx < self.board_size and 0 <= y + (i + 1) * dy < self.board_size and \
-                        board[x + (i + 1) * dx, y + (i + 1) * dy] == player:
-                    open_ends += 1
-        return count, open_ends >= 2
-
-    def _evaluate_position(self, board: np.ndarray, x: int, y: int, player: int) -> int:
-        score, directions = 0, [(1, 0), (0, 1), (1, 1), (1, -1)]
-        temp_board = board.copy()
-        temp_board[x, y] = player
-        threes, fours = 0, 0
-        for dx, dy in directions:
-            count, is_live = self._count_line(temp_board, x, y, dx, dy, player)
-            if count >= 5: return 100000
-            if count == 4: fours += 1
-            if count == 3 and is_live: threes += 1
-        if fours > 0 or threes > 1: return 10000
-        score += threes * 1000
-        opponent = 3 - player
-        temp_board[x, y] = opponent
-        threes, fours = 0, 0
-        for dx, dy in directions:
-            count, is_live = self._count_line(temp_board, x, y, dx, dy, opponent)
-            if count >= 5: score += 50000
-            if count == 4: fours += 1
-            if count == 3 and is_live: threes += 1
-        if fours > 0 or threes > 1: score += 5000
-        score += threes * 500
-        return score + (self.board_size - (abs(x - self.board_size // 2) + abs(y - self.board_size // 2)))
+    def _warmup_ai(self):
+        """插件加载时先跑一次搜索，让 JIT 编译不落在第一位玩家的回合里"""
+        board = np.zeros((self.board_size, self.board_size), dtype=np.int8)
+        center = self.board_size // 2
+        board[center, center] = 1
+        try:
+            _alphabeta(board, _build_candidates(board), self._zobrist, self._tt_keys, self._tt_vals,
+                       int(self._zobrist[center, center, 1]), 1, -_AI_INF, _AI_INF, 2, center, center)
+        except Exception as e:
+            logger.error(f"AI 预热失败: {e}")
 
     def _ai_move(self, game_id: str) -> Optional[Tuple[int, int]]:
         game = self.games.get(game_id)
         if not game: return None
-        board, current_player = game["board"], game["current_player"]
-        best_move, max_score = None, -1
-        for r in range(self.board_size):
-            for c in range(self.board_size):
-                if board[r, c] == 0:
-                    score = self._evaluate_position(board, r, c, current_player)
-                    if score > max_score: max_score, best_move = score, (r, c)
-        logger.info(f"AI Move for Game {game_id}: {best_move} with score {max_score}")
+        # 搜索内核原地落子并还原，且运行时不持有 GIL，事件循环可能同时读取棋盘（如绘图），
+        # 因此在副本上搜索，避免外部看到搜索中途的临时棋子
+        board, cand, current_player = game.board.copy(), game.candidates.copy(), game.current_player
+        center = self.board_size // 2
+        if not board.any(): return (center, center)
+        last_x, last_y = game.last_move or (center, center)
+        # 迭代加深：每层单独计时，用实测的相邻层耗时之比预测下一层耗时（第 1 层之后先用 _AI_DEPTH_GROWTH 估计），
+        # 已用时间加上预测耗时超出预算就不再加深；单层搜索无法中断，预算只是软上限
+        start, best_move, max_score, depth = time.perf_counter(), None, 0, 0
+        prev_time, prev_growth, growth = 0.0, 1.0, _AI_DEPTH_GROWTH
+        for depth in range(1, _AI_SEARCH_DEPTH + 1):
+            iter_start = time.perf_counter()
+            score, best_x, best_y = _alphabeta(board, cand, self._zobrist, self._tt_keys, self._tt_vals,
+                                               game.zhash, depth, -_AI_INF, _AI_INF, current_player, last_x, last_y)
+            now = time.perf_counter()
+            if best_x < 0: break
+            best_move, max_score = (int(best_x), int(best_y)), score
+            if score >= _AI_WIN_SCORE: break  # 已找到必胜着法
+            iter_time = now - iter_start
+            if prev_time > 0:
+                # alpha-beta 的耗时增长奇偶层交替（奇数层之后的一层涨幅远大于偶数层之后），
+                # 只看最近一次比值会低估下一层，因此取最近两次比值中较大者
+                growth, prev_growth = max(iter_time / prev_time, prev_growth), iter_time / prev_time
+            prev_time = iter_time
+            if now - start + iter_time * growth > self.ai_time_budget: break
+        logger.info(f"AI Move for Game {game_id}: {best_move} with score {max_score} (depth {depth})")
         return best_move
 
 
-    def _draw_board(self, board: np.ndarray, last_move: Optional[Tuple[int, int]] = None,
-                    game_id: str = "default") -> str:
+    def _build_board_template(self) -> PILImage.Image:
+        """预先绘制与棋局无关的底图：背景、网格、星位与坐标标签"""
         cell_size, margin = 40, 40
         size = self.board_size * cell_size + 2 * margin
         image = PILImage.new("RGB", (size, size), (220, 220, 220))
@@ -189,29 +563,61 @@ class WuziqiPlugin(Star):
             x = margin + i * cell_size
             draw.line([(x, margin), (x, board_end)], fill="black")
             draw.line([(margin, x), (board_end, x)], fill="black")
-        star_points = [(3, 3), (11, 3), (3, 11), (11, 11), (7, 7)]
-        for sx, sy in star_points:
+        for sx, sy in self._star_points:
             cx, cy = margin + sx * cell_size, margin + sy * cell_size
             draw.ellipse((cx - 5, cy - 5, cx + 5, cy + 5), fill="black")
-        for r in range(self.board_size):
-            for c in range(self.board_size):
-                if board[r, c] != 0:
-                    cx, cy = margin + c * cell_size, margin + r * cell_size
-                    color = "black" if board[r, c] == 1 else "white"
-                    draw.ellipse((cx - 15, cy - 15, cx + 15, cy + 15), fill=color, outline="gray")
-                    if last_move and last_move == (r, c):
-                        draw.ellipse((cx - 5, cy - 5, cx + 5, cy + 5), fill="red")
         for i in range(self.board_size):
             col_label, row_label = str(i + 1), chr(65 + i)
             draw.text((margin + i * cell_size, margin - 25), col_label, fill="black", font=font, anchor="ms")
             draw.text((margin - 25, margin + i * cell_size), row_label, fill="black", font=font, anchor="rm")
-        image_path = str(self.data_path / f"board_{game_id}.png")
-        image.save(image_path)
-        return image_path
-
-    def _draw_rankings_image(self) -> str:
+        return image
+
+    def _build_stone_sprites(self) -> Dict[int, PILImage.Image]:
+        """预先绘制黑白棋子贴图（透明底），出图时直接贴到底图上，不再逐颗光栅化椭圆"""
+        sprites = {}
+        for player, color in ((1, "black"), (2, "white")):
+            sprite = PILImage.new("RGBA", (31, 31), (0, 0, 0, 0))
+            ImageDraw.Draw(sprite).ellipse((0, 0, 30, 30), fill=color, outline="gray")
+            sprites[player] = sprite
+        return sprites
+
+    def _encode_png(self, image: PILImage.Image) -> bytes:
+        # 图片直接编码到内存发送，不落盘；图像色彩单一，最低压缩等级体积相差无几但编码快数倍
+        buf = io.BytesIO()
+        image.save(buf, format="PNG", optimize=False, compress_level=1)
+        return buf.getvalue()
+
+    def _draw_board(self, board: np.ndarray, last_move: Optional[Tuple[int, int]] = None) -> bytes:
+        cell_size, margin = 40, 40
+        image = self._board_template.copy()
+        for player, sprite in self._stone_sprites.items():
+            for r, c in np.argwhere(board == player):
+                image.paste(sprite, (margin + c * cell_size - 15, margin + r * cell_size - 15), sprite)
+        if last_move and board[last_move] != 0:
+            cx, cy = margin + last_move[1] * cell_size, margin + last_move[0] * cell_size
+            ImageDraw.Draw(image).ellipse((cx - 5, cy - 5, cx + 5, cy + 5), fill="red")
+        return self._encode_png(image)
+
+    async def _render_board(self, game: Game) -> bytes:
+        # 以 Zobrist 哈希 + 最后一手作为缓存键，命中时无需复制或序列化棋盘
+        key = (game.zhash, game.last_move)
+        cache = self._board_image_cache
+        board_image = cache.get(key)
+        if board_image is not None:
+            cache.move_to_end(key)
+            return board_image
+        # 复制一份再交给线程绘制，避免绘制期间棋盘被改动导致图片与缓存键不符
+        board_image = await asyncio.to_thread(self._draw_board, game.board.copy(), game.last_move)
+        cache[key] = board_image
+        if len(cache) > self.board_image_cache_size: cache.popitem(last=False)
+        return board_image
+
+    def _draw_rankings_image(self) -> bytes:
+        # 排行榜未变动时直接复用上次的图片，跳过排序与绘制
+        version, cached = self._rankings_version, self._rankings_image
+        if cached and cached[0] == version: return cached[1]
         sorted_rankings = sorted(self.rankings.items(), key=lambda x: x[1]["wins"], reverse=True)[:10]
-        if not sorted_rankings: return ""
+        if not sorted_rankings: return b""
         title_height, cell_height, margin = 50, 40, 20
         cell_widths = [60, 150, 80, 80, 80, 100, 100]
         total_width, total_height = sum(cell_widths), title_height + cell_height * (len(sorted_rankings) + 1)
@@ -227,21 +633,26 @@ class WuziqiPlugin(Star):
             x_pos += cell_widths[i]
         y_pos += cell_height
         for i, (player_id, data) in enumerate(sorted_rankings, 1):
-            wins, losses, draws = data.get("wins", 0), data.get("losses", 0), data.get("draws", 0)
-            total = wins + losses + draws
-            win_rate = f"{(wins / total * 100):.1f}%" if total > 0 else "N/A"
-            row_data = [str(i), data.get('name', '未知'), str(wins), str(draws), str(losses), str(total), win_rate]
+            total = data["total"]
+            win_rate = f"{data['win_rate']:.1f}%" if total > 0 else "N/A"
+            row_data = [str(i), data.get('name', '未知'), str(data["wins"]), str(data["draws"]), str(data["losses"]),
+                        str(total), win_rate]
             x_pos = margin
             for j, text in enumerate(row_data):
                 draw.text((x_pos + cell_widths[j] / 2, y_pos + cell_height / 2), text, fill="black", font=font,
                           anchor="mm")
                 x_pos += cell_widths[j]
             y_pos += cell_height
-        image_path = str(self.data_path / f"rankings_{int(time.time())}.png")
-        image.save(image_path)
-        return image_path
+        png = self._encode_png(image)
+        self._rankings_image = (version, png)
+        return png
 
     def _get_system_font(self, size: int) -> ImageFont:
+        font = self._font_cache.get(size)
+        if font is None: font = self._font_cache[size] = self._load_font(size)
+        return font
+
+    def _load_font(self, size: int) -> ImageFont:
         try:
             if self.font_path.exists(): return ImageFont.truetype(str(self.font_path), size)
             if platform.system() == "Windows":
@@ -256,20 +667,19 @@ class WuziqiPlugin(Star):
             return ImageFont.load_default()
 
     def _parse_position(self, text: str) -> Optional[Tuple[int, int]]:
+        # 直接比较字符而不走正则：行为 A 至最后一行的字母，列为不带前导 0 的 1-board_size
         text = text.strip().upper()
-        match = re.match(r'^([A-O])(1[0-5]|[1-9])$', text)
-        if match:
-            row_char, col_str = match.groups()
-            row, col = ord(row_char) - ord('A'), int(col_str) - 1
-            return (row, col)
-        return None
+        row_char, col_str = text[:1], text[1:]
+        if not ('A' <= row_char <= self._last_row and col_str.isascii() and col_str.isdigit()): return None
+        if col_str[0] == '0' or not 1 <= int(col_str) <= self.board_size: return None
+        return (ord(row_char) - ord('A'), int(col_str) - 1)
 
     def _generate_game_id(self) -> str:
         while True:
             game_id = str(random.randint(1000, 9999))
             if game_id not in self.games: return game_id
 
-    def _get_game_by_player(self, player_id: str) -> Optional[dict]:
+    def _get_game_by_player(self, player_id: str) -> Optional[Game]:
         game_id = self.player_to_game.get(player_id)
         if not game_id: return None
         game = self.games.get(game_id)
@@ -278,23 +688,33 @@ class WuziqiPlugin(Star):
             return None
         return game
 
+    def _new_game(self, game_id: str, player1: dict, player2: Optional[dict], status: str) -> Game:
+        board = self._init_board()
+        return Game(id=game_id, board=board, players={1: player1, 2: player2}, status=status,
+                    roles={p["id"]: num for num, p in ((1, player1), (2, player2)) if p},
+                    history=deque(maxlen=self.board_size ** 2), candidates=_build_candidates(board))
+
+    def _seat_player(self, game: Game, num: int, player: dict):
+        game.players[num] = player
+        game.roles[player["id"]] = num
+
+    def _cancel_wait_task(self, game_id: str):
+        task = self.wait_tasks.pop(game_id, None)
+        if task: task.cancel()
+
     def _cleanup_game_state(self, game_id: str):
         game = self.games.pop(game_id, None)
         if game:
             for player_num in [1, 2]:
-                player_info = game["players"].get(player_num)
-                if player_info and player_info["id"] in self.player_to_game:
-                    del self.player_to_game[player_info["id"]]
+                player_info = game.players.get(player_num)
+                if player_info: self.player_to_game.pop(player_info["id"], None)
 
         # 从大厅移除对局的核心逻辑
         self.lobby = [g for g in self.lobby if g.get('game_id') != game_id]
 
-        if game_id in self.undo_stats: del self.undo_stats[game_id]
-        if game_id in self.wait_tasks: self.wait_tasks.pop(game_id).cancel()
-        if game_id in self.peace_requests: self.peace_requests.pop(game_id, {}).get("timeout_task",
-                                                                                    asyncio.Future()).cancel()
-        if game_id in self.undo_requests: self.undo_requests.pop(game_id, {}).get("timeout_task",
-                                                                                  asyncio.Future()).cancel()
+        self._cancel_wait_task(game_id)
+        self._close_request(self.peace_requests, game_id)
+        self._close_request(self.undo_requests, game_id)
         logger.info(f"游戏状态已清理, Game ID: {game_id}")
 
 
@@ -308,10 +728,7 @@ class WuziqiPlugin(Star):
         game_id = self._generate_game_id()
         self.player_to_game[sender_id] = game_id
         player1_info = {"id": sender_id, "name": sender_name, "context": event.unified_msg_origin}
-        self.games[game_id] = {
-            "id": game_id, "board": self._init_board(), "current_player": 1, "last_move": None,
-            "players": {1: player1_info, 2: None}, "history": [], "status": "pending"
-        }
+        self.games[game_id] = self._new_game(game_id, player1_info, None, "pending")
 
         # 将新创建的游戏加入大厅
         self.lobby.append({
@@ -320,7 +737,6 @@ class WuziqiPlugin(Star):
             "game_id": game_id
         })
 
-        self.undo_stats[game_id] = {}
         task = asyncio.create_task(self._wait_for_join_timeout(game_id))
         self.wait_tasks[game_id] = task
         logger.info(f"新游戏创建, ID: {game_id}, 发起者: {sender_name}({sender_id})")
@@ -335,8 +751,8 @@ class WuziqiPlugin(Star):
     async def _wait_for_join_timeout(self, game_id: str):
         await asyncio.sleep(self.join_timeout)
         game = self.games.get(game_id)
-        if game and game["status"] == "pending":
-            creator_context = game["players"][1]["context"]
+        if game and game.status == "pending":
+            creator_context = game.players[1]["context"]
             message_to_send = MessageChain([Plain(f"游戏【{game_id}】因等待玩家超时而被自动取消。")])
             await self.context.send_message(creator_context, message_to_send)
             self._cleanup_game_state(game_id)
@@ -347,22 +763,22 @@ class WuziqiPlugin(Star):
         if not game_id or not game_id.isdigit(): yield event.plain_result("指令格式错误。"); return
         if self._get_game_by_player(sender_id): yield event.plain_result("您已在游戏中。"); return
         game = self.games.get(game_id)
-        if not game or game["status"] != "pending": yield event.plain_result(f"游戏【{game_id}】不可加入。"); return
-        if game["players"][1]["id"] == sender_id: yield event.plain_result("不能加入自己的游戏。"); return
+        if not game or game.status != "pending": yield event.plain_result(f"游戏【{game_id}】不可加入。"); return
+        if game.players[1]["id"] == sender_id: yield event.plain_result("不能加入自己的游戏。"); return
 
         # 因为游戏即将开始，状态会变为 active，所以在此处清理大厅信息
         # _cleanup_game_state 会处理所有清理工作，包括大厅
         self.lobby = [g for g in self.lobby if g.get('game_id') != game_id]
 
-        if game_id in self.wait_tasks: self.wait_tasks.pop(game_id).cancel()
-        game["players"][2] = {"id": sender_id, "name": event.get_sender_name(), "context": event.unified_msg_origin}
-        game["status"] = "active"
+        self._cancel_wait_task(game_id)
+        self._seat_player(game, 2, {"id": sender_id, "name": event.get_sender_name(), "context": event.unified_msg_origin})
+        game.status = "active"
         self.player_to_game[sender_id] = game_id
-        p1, p2 = game["players"][1], game["players"][2]
+        p1, p2 = game.players[1], game.players[2]
         logger.info(f"玩家 {p2['name']} 加入游戏 {game_id}，对手是 {p1['name']}")
-        board_path = self._draw_board(game["board"], game_id=game_id)
+        board_image = await self._render_board(game)
         msg = f"{p2['name']} 已加入游戏【{game_id}】，对战开始！\n黑方: {p1['name']}\n白方: {p2['name']}\n\n轮到黑方落子。"
-        msg_components = [Plain(msg), Image.fromFileSystem(board_path)]
+        msg_components = [Plain(msg), Image.fromBytes(board_image)]
         if p1["context"] == p2["context"]:
             yield event.chain_result(msg_components)
         else:
@@ -380,23 +796,22 @@ class WuziqiPlugin(Star):
             self.player_to_game[sender_id] = game_id
             p1_info = {"id": sender_id, "name": event.get_sender_name(), "context": event.unified_msg_origin}
             p2_info = {"id": "AI", "name": "AI 玩家", "is_ai": True, "context": None}
-            self.games[game_id] = {
-                "id": game_id, "board": self._init_board(), "current_player": 1, "last_move": None,
-                "players": {1: p1_info, 2: p2_info}, "history": [], "status": "active"
-            }
+            self.games[game_id] = self._new_game(game_id, p1_info, p2_info, "active")
             logger.info(f"新的人机对局开始, ID: {game_id}, 玩家: {p1_info['name']}")
             yield event.plain_result(f"与AI的对局已开始！ID:【{game_id}】\n您是黑方，请先落子。")
-            yield event.image_result(self._draw_board(self.games[game_id]["board"], game_id=game_id))
+            board_image = await self._render_board(self.games[game_id])
+            yield event.chain_result([Image.fromBytes(board_image)])
             return
-        if game["status"] == "pending" and game["players"][1]["id"] == sender_id:
+        if game.status == "pending" and game.players[1]["id"] == sender_id:
             # 从等待状态转为人机，需要清理大厅
-            self.lobby = [g for g in self.lobby if g.get('game_id') != game['id']]
-            if game["id"] in self.wait_tasks: self.wait_tasks.pop(game["id"]).cancel()
-            game["players"][2] = {"id": "AI", "name": "AI 玩家", "is_ai": True, "context": None}
-            game["status"] = "active"
-            logger.info(f"游戏 {game['id']} 转为人机模式。")
-            yield event.plain_result(f"已匹配AI！游戏【{game['id']}】开始，您是黑方，请落子。")
-            yield event.image_result(self._draw_board(game["board"], game_id=game['id']))
+            self.lobby = [g for g in self.lobby if g.get('game_id') != game.id]
+            self._cancel_wait_task(game.id)
+            self._seat_player(game, 2, {"id": "AI", "name": "AI 玩家", "is_ai": True, "context": None})
+            game.status = "active"
+            logger.info(f"游戏 {game.id} 转为人机模式。")
+            yield event.plain_result(f"已匹配AI！游戏【{game.id}】开始，您是黑方，请落子。")
+            board_image = await self._render_board(game)
+            yield event.chain_result([Image.fromBytes(board_image)])
             return
         yield event.plain_result("您已在进行中的对局里，无法开始人机对战。")
         event.stop_event()
@@ -409,19 +824,19 @@ class WuziqiPlugin(Star):
             yield event.plain_result("您没有正在创建或进行中的游戏。")
             event.stop_event()
             return
-        if not (game["status"] == "pending" and game["players"][1]["id"] == sender_id):
+        if not (game.status == "pending" and game.players[1]["id"] == sender_id):
             yield event.plain_result("只能取消由您发起且未开始的游戏。");
             event.stop_event()
             return
-        self._cleanup_game_state(game["id"])
+        self._cleanup_game_state(game.id)
         yield event.plain_result("游戏已取消。")
         event.stop_event()
 
-    @filter.regex(r'^[A-Oa-o](1[0-5]|[1-9])$', flags=re.IGNORECASE)
+    @filter.regex(_MOVE_PATTERN, flags=re.IGNORECASE)
     async def handle_coordinate_move(self, event: AstrMessageEvent):
         sender_id = event.get_sender_id()
         game = self._get_game_by_player(sender_id)
-        if game and game['status'] == 'active':
+        if game and game.status == 'active':
             async for result in self._handle_move(event, game): yield result
 
     @filter.command("落子")
@@ -433,149 +848,201 @@ class WuziqiPlugin(Star):
             yield event.plain_result("您不在任何对局中。")
             event.stop_event()
             return
-        if game['status'] != 'active':
+        if game.status != 'active':
             yield event.plain_result("游戏尚未开始。")
             event.stop_event()
             return
         async for result in self._handle_move(event, game): yield result
         event.stop_event()
 
-    async def _handle_move(self, event: AstrMessageEvent, game: dict):
+    async def _handle_move(self, event: AstrMessageEvent, game: Game):
         sender_id, position_str = event.get_sender_id(), event.message_str.strip()
-        game_id, current_player_num = game["id"], game["current_player"]
-        mover_data = game["players"][current_player_num]
+        game_id, current_player_num, players = game.id, game.current_player, game.players
+        mover_data = players[current_player_num]
 
         if mover_data["id"] != sender_id:
-            yield event.plain_result(f"当前轮到 {game['players'][game['current_player']]['name']}。");
+            yield event.plain_result(f"当前轮到 {mover_data['name']}。");
             return
         pos = self._parse_position(position_str)
         if not pos: yield event.plain_result("坐标格式错误，请使用如 'A1'。"); return
         row, col = pos
-        if not self._is_valid_move(game["board"], row, col): yield event.plain_result("无效落子。"); return
-
-        game["board"][row, col], game["last_move"] = current_player_num, (row, col)
-        game["history"].append(
-            {"player": current_player_num, "position": position_str.upper(), "board": game["board"].copy()})
-        logger.info(f"Game {game_id}: 玩家 {mover_data['name']} 落子于 {position_str.upper()}")
-        board_path = self._draw_board(game["board"], game["last_move"], game_id)
-
-        if self._check_win(game["board"], row, col, current_player_num):
-            winner, loser = mover_data, game["players"][3 - current_player_num]
-            msg = f"{mover_data['name']} 落子于 {position_str.upper()}。\n游戏结束！{winner['name']} 获胜！"
-            await self._broadcast_final_message(game, msg, board_path)
+        move_str = position_str.upper()
+        if not self._is_valid_move(game.board, row, col): yield event.plain_result("无效落子。"); return
+
+        self._place_stone(game, row, col, current_player_num)
+        game.last_move = (row, col)
+        game.history.append(self._pack_move(current_player_num, row, col))
+        logger.info(f"Game {game_id}: 玩家 {mover_data['name']} 落子于 {move_str}")
+
+        won = self._check_win(game, row, col, current_player_num)
+        full = not won and self._check_draw(game)
+        if won or full:
+            # 绘图会让出事件循环，先标记对局结束，避免期间继续接受落子
+            game.status = "finished"
+            board_image = await self._render_board(game)
+        if won:
+            winner, loser = mover_data, players[3 - current_player_num]
+            msg = f"{mover_data['name']} 落子于 {move_str}。\n游戏结束！{winner['name']} 获胜！"
+            self._broadcast_final_message(game, msg, board_image)
             self._update_rankings(winner['id'], winner['name'], loser['id'], loser['name']);
             self._cleanup_game_state(game_id);
             return
 
-        if self._check_draw(game["board"]):
-            p1, p2 = game["players"][1], game["players"][2]
-            msg = f"{mover_data['name']} 落子于 {position_str.upper()}。\n游戏结束！棋盘已满，双方平局！"
-            await self._broadcast_final_message(game, msg, board_path)
+        if full:
+            p1, p2 = players[1], players[2]
+            msg = f"{mover_data['name']} 落子于 {move_str}。\n游戏结束！棋盘已满，双方平局！"
+            self._broadcast_final_message(game, msg, board_image)
             self._update_draw_rankings(p1['id'], p1['name'], p2['id'], p2['name'])
             self._cleanup_game_state(game_id)
             return
 
-        game["current_player"] = 3 - game["current_player"]
-        opponent_data = game["players"][game["current_player"]]
+        game.current_player = 3 - current_player_num
+        opponent_data = players[game.current_player]
 
         if opponent_data.get("is_ai"):
-            await asyncio.sleep(0.5)
-            ai_move = self._ai_move(game_id)
+            # 搜索是 CPU 密集操作，放到专用的 AI 线程中执行以免阻塞事件循环与其他对局的绘图；
+            # 思考期间 current_player 已是 AI，玩家的落子会被拒绝，AI 对局也不接受悔棋，无需额外加锁
+            ai_move = await asyncio.get_running_loop().run_in_executor(self._ai_executor, self._ai_move, game_id)
+            if self.games.get(game_id) is not game: return  # 思考期间对局已结束（如玩家认输）
             if ai_move:
                 ai_row, ai_col = ai_move;
-                game["board"][ai_row, ai_col], game["last_move"] = game["current_player"], (ai_row, ai_col)
+                ai_player = game.current_player
+                self._place_stone(game, ai_row, ai_col, ai_player)
+                game.last_move = (ai_row, ai_col)
+                game.history.append(self._pack_move(ai_player, ai_row, ai_col))
                 ai_pos_str = f"{chr(65 + ai_row)}{ai_col + 1}"
-                board_path = self._draw_board(game["board"], game["last_move"], game_id)
-                msg = f"您落子于 {position_str.upper()}。\n{opponent_data['name']} 回应于 {ai_pos_str}。"
-                if self._check_win(game["board"], ai_row, ai_col, game["current_player"]):
+                ai_won = self._check_win(game, ai_row, ai_col, ai_player)
+                if ai_won:
+                    game.status = "finished"
+                else:
+                    game.current_player = 3 - ai_player
+                board_image = await self._render_board(game)
+                msg = f"您落子于 {move_str}。\n{opponent_data['name']} 回应于 {ai_pos_str}。"
+                if ai_won:
                     winner, loser = opponent_data, mover_data;
                     msg += f"\n游戏结束！{winner['name']} 获胜！"
-                    yield event.chain_result([Plain(msg), Image.fromFileSystem(board_path)])
+                    yield event.chain_result([Plain(msg), Image.fromBytes(board_image)])
                     self._update_rankings(winner['id'], winner['name'], loser['id'], loser['name']);
                     self._cleanup_game_state(game_id);
                     return
-                game["current_player"] = 3 - game["current_player"]
-                msg += f"\n轮到您 ({game['players'][game['current_player']]['name']}) 落子。"
-                yield event.chain_result([Plain(msg), Image.fromFileSystem(board_path)])
+                msg += f"\n轮到您 ({mover_data['name']}) 落子。"
+                yield event.chain_result([Plain(msg), Image.fromBytes(board_image)])
         else:
+            board_image = await self._render_board(game)
             mover_context = event.unified_msg_origin
             opponent_context = opponent_data.get("context")
             opponent_id = opponent_data['id']
 
             if mover_context == opponent_context:
-                msg_text = (f"玩家 {mover_data['name']} 落子于 {position_str.upper()}。\n"
+                msg_text = (f"玩家 {mover_data['name']} 落子于 {move_str}。\n"
                             f"现在轮到 {opponent_data['name']}。")
-                msg_components = [At(qq=opponent_id), Plain(f" {msg_text}"), Image.fromFileSystem(board_path)]
+                msg_components = [At(qq=opponent_id), Plain(f" {msg_text}"), Image.fromBytes(board_image)]
                 yield event.chain_result(msg_components)
             else:
                 if opponent_context:
-                    msg_for_opponent = f"对手 ({mover_data['name']}) 落子于 {position_str.upper()}。轮到您落子。"
+                    msg_for_opponent = f"对手 ({mover_data['name']}) 落子于 {move_str}。轮到您落子。"
                     opponent_msg_list = [At(qq=opponent_id), Plain(f" {msg_for_opponent}"),
-                                         Image.fromFileSystem(board_path)]
+                                         Image.fromBytes(board_image)]
                     await self.context.send_message(opponent_context, MessageChain(opponent_msg_list))
 
-                msg_for_mover = f"您落子于 {position_str.upper()}。等待对手 ({opponent_data['name']}) 回应。"
-                mover_msg_list = [Plain(msg_for_mover), Image.fromFileSystem(board_path)]
+                msg_for_mover = f"您落子于 {move_str}。等待对手 ({opponent_data['name']}) 回应。"
+                mover_msg_list = [Plain(msg_for_mover), Image.fromBytes(board_image)]
                 yield event.chain_result(mover_msg_list)
 
-    async def _broadcast_final_message(self, game: dict, msg: str, board_path: Optional[str]):
-        """向对局双方广播相同的最终消息"""
-        p1 = game["players"][1]
-        p2 = game["players"][2]
+    def _send_in_background(self, session, message: MessageChain):
+        """主动消息放到后台任务中发送，调用方无需等待网络 I/O 即可继续处理"""
+        task = asyncio.create_task(self._safe_send(session, message))
+        self._send_tasks.add(task)
+        task.add_done_callback(self._send_tasks.discard)
+
+    async def _safe_send(self, session, message: MessageChain):
+        try:
+            await self.context.send_message(session, message)
+        except Exception as e:
+            logger.error(f"发送五子棋消息失败: {e}")
+
+    def _broadcast_final_message(self, game: Game, msg: str, board_image: Optional[bytes]):
+        """向对局双方广播相同的最终消息（后台发送，不阻塞当前指令）"""
+        p1 = game.players[1]
+        p2 = game.players[2]
         msg_list = [Plain(msg)]
-        if board_path: msg_list.append(Image.fromFileSystem(board_path))
+        if board_image: msg_list.append(Image.fromBytes(board_image))
         message_to_send = MessageChain(msg_list)
-        if p1.get("context"): await self.context.send_message(p1["context"], message_to_send)
+        if p1.get("context"): self._send_in_background(p1["context"], message_to_send)
         if not p2.get("is_ai") and p2.get("context") and p2.get("context") != p1.get("context"):
-            await self.context.send_message(p2["context"], message_to_send)
+            self._send_in_background(p2["context"], message_to_send)
 
     # --- 悔棋与求和 ---
-    async def _request_timeout(self, game_id: str, request_type: str):
-        await asyncio.sleep(self.request_timeout_duration)
+    def _get_action_game(self, event: AstrMessageEvent, request_map: Optional[Dict[str, PendingRequest]] = None) -> Optional[Game]:
+        """悔棋/求和/认输等操作的公共前置检查：返回发送者所在的进行中对局，
+        传入 request_map 时还要求该对局有待处理的请求；不满足时终止事件并返回 None。
+        落子分出胜负后会先标记 finished 再等待绘图，期间对局仍可查到，必须检查状态以免改写已结束的对局"""
+        game = self._get_game_by_player(event.get_sender_id())
+        if game and game.status == 'active' and (request_map is None or game.id in request_map): return game
+        event.stop_event()
+        return None
+
+    def _claim_request(self, event: AstrMessageEvent, request_map: Dict[str, PendingRequest]) -> Tuple[Optional[Game], Optional[PendingRequest]]:
+        """接受/拒绝悔棋或求和的公共前置：没有待处理请求时返回 (None, None)；发送者是发起者本人时返回 (对局, None)；
+        否则关闭请求并返回 (对局, 请求)。前两种情况已终止事件"""
+        game = self._get_action_game(event, request_map)
+        if not game: return None, None
+        request = request_map[game.id]
+        if request.proposer == event.get_sender_id():
+            event.stop_event()
+            return game, None
+        self._close_request(request_map, game.id)
+        return game, request
+
+    def _reject_request(self, event: AstrMessageEvent, request_map: Dict[str, PendingRequest], label: str):
+        game, request = self._claim_request(event, request_map)
+        if not request: return
+        self._broadcast_final_message(game, f"{event.get_sender_name()} 拒绝了{label}请求，游戏继续。", None)
+        event.stop_event()
+
+    def _close_request(self, request_map: Dict[str, PendingRequest], game_id: str):
+        """移除悔棋/求和请求并取消其超时计时器"""
+        request = request_map.pop(game_id, None)
+        if request: request.timeout_handle.cancel()
+
+    def _expire_request(self, game_id: str, request_type: str):
+        """悔棋/求和请求到期的回调，由 loop.call_later 调度，请求仍未处理时才移除并通知发起者"""
         request_map = self.undo_requests if request_type == "undo" else self.peace_requests
-        if game_id in request_map:
-            request_data = request_map.pop(game_id)
-            proposer_id = request_data['proposer']
-            game = self.games.get(game_id)
-            if game:
-                proposer_player_num = 1 if game['players'][1]['id'] == proposer_id else 2
-                proposer_player = game['players'][proposer_player_num]
-                if proposer_player and proposer_player.get("context"):
-                    msg = f"您的{'悔棋' if request_type == 'undo' else '求和'}请求已超时，对方未响应。"
-                    await self.context.send_message(proposer_player["context"], MessageChain([Plain(msg)]))
+        request_data = request_map.pop(game_id, None)
+        game = self.games.get(game_id)
+        if not request_data or not game: return
+        proposer_player = game.players[request_data.proposer_num]
+        if proposer_player.get("context"):
+            msg = f"您的{'悔棋' if request_type == 'undo' else '求和'}请求已超时，对方未响应。"
+            self._send_in_background(proposer_player["context"], MessageChain([Plain(msg)]))
 
     @filter.command("悔棋")
     async def handle_undo_request(self, event: AstrMessageEvent):
         sender_id = event.get_sender_id()
-        game = self._get_game_by_player(sender_id)
-        if not game or game['status'] != 'active':
-            event.stop_event()
-            return
-        game_id = game['id']
+        game = self._get_action_game(event)
+        if not game: return
+        game_id = game.id
         if game_id in self.undo_requests:
             yield event.plain_result("已有悔棋请求等待响应。")
             event.stop_event()
             return
-        if len(game['history']) < 1:
+        if len(game.history) < 1:
             yield event.plain_result("棋局尚未开始，无法悔棋。")
             event.stop_event()
             return
 
-        proposer_num = 1 if game['players'][1]['id'] == sender_id else 2
-        opponent_data = game['players'][3 - proposer_num]
+        proposer_num, players = game.roles[sender_id], game.players
+        opponent_data = players[3 - proposer_num]
 
         if opponent_data.get('is_ai'):
             yield event.plain_result("你不能向AI请求悔棋。")
             event.stop_event()
             return
 
-        self.undo_requests[game_id] = {
-            "proposer": sender_id,
-            "proposer_player_num": proposer_num,
-            "timeout_task": asyncio.create_task(self._request_timeout(game_id, "undo"))
-        }
+        self.undo_requests[game_id] = PendingRequest(sender_id, proposer_num, asyncio.get_running_loop().call_later(
+            self.request_timeout_duration, self._expire_request, game_id, "undo"))
 
-        proposer_name = game['players'][proposer_num]['name']
+        proposer_name = players[proposer_num]['name']
         opponent_context = opponent_data.get("context")
         opponent_id = opponent_data.get("id")
 
@@ -588,85 +1055,48 @@ class WuziqiPlugin(Star):
 
     @filter.command("接受悔棋")
     async def handle_accept_undo(self, event: AstrMessageEvent):
-        sender_id = event.get_sender_id()
-        game = self._get_game_by_player(sender_id)
-        if not game or game['id'] not in self.undo_requests:
-            event.stop_event()
-            return
-        game_id = game['id']
-        request = self.undo_requests[game_id]
-
-        if request['proposer'] == sender_id:
+        game, request = self._claim_request(event, self.undo_requests)
+        if not game: return
+        if not request:
             yield event.plain_result("你不能接受自己的悔棋请求。")
-            event.stop_event()
-            return
-
-        request['timeout_task'].cancel()
-        del self.undo_requests[game_id]
-
-        moves_to_undo = 2 if len(game['history']) > 1 and game['history'][-1]['player'] != request[
-            'proposer_player_num'] else 1
-        if len(game['history']) < moves_to_undo:
-            await self._broadcast_final_message(game, "历史记录不足，无法悔棋。", None);
-            event.stop_event()
             return
 
-        for _ in range(moves_to_undo): game['history'].pop()
+        # 发起悔棋时已保证至少有一手棋，且请求未处理前无法再悔棋，历史只增不减，因此无需再检查长度；
+        # 最后一手若是对方下的，连同发起者自己的上一手一起撤回
+        moves_to_undo = 2 if len(game.history) > 1 and game.history[-1] >> 16 != request.proposer_num else 1
 
-        if game['history']:
-            last_state = game['history'][-1]
-            game['board'] = last_state['board'].copy()
-            game['last_move'] = self._parse_position(last_state['position'])
-        else:
-            game['board'] = self._init_board()
-            game['last_move'] = None
-
-        game['current_player'] = request['proposer_player_num']
+        self._undo_moves(game, moves_to_undo)
+        game.current_player = request.proposer_num
 
-        board_path = self._draw_board(game['board'], game['last_move'], game_id)
-        proposer_name = game['players'][request['proposer_player_num']]['name']
+        board_image = await self._render_board(game)
+        proposer_name = game.players[request.proposer_num]['name']
         msg = f"{event.get_sender_name()} 同意了悔棋请求。\n现在轮到 {proposer_name} 重新落子。"
-        await self._broadcast_final_message(game, msg, board_path)
+        self._broadcast_final_message(game, msg, board_image)
         event.stop_event()
 
     @filter.command("拒绝悔棋")
     async def handle_reject_undo(self, event: AstrMessageEvent):
-        sender_id = event.get_sender_id()
-        game = self._get_game_by_player(sender_id)
-        if not game or game['id'] not in self.undo_requests:
-            event.stop_event()
-            return
-        request = self.undo_requests[game['id']]
-        if request['proposer'] == sender_id:
-            event.stop_event()
-            return
-
-        request['timeout_task'].cancel()
-        del self.undo_requests[game['id']]
-        await self._broadcast_final_message(game, f"{event.get_sender_name()} 拒绝了悔棋请求，游戏继续。", None)
-        event.stop_event()
+        self._reject_request(event, self.undo_requests, "悔棋")
 
     @filter.command("求和")
     async def handle_peace_request(self, event: AstrMessageEvent):
         sender_id = event.get_sender_id()
-        game = self._get_game_by_player(sender_id)
-        if not game or game['status'] != 'active':
-            event.stop_event()
-            return
-        game_id = game['id']
+        game = self._get_action_game(event)
+        if not game: return
+        game_id = game.id
         if game_id in self.peace_requests:
             yield event.plain_result("已有求和请求等待响应。")
             event.stop_event()
             return
 
-        proposer_num = 1 if game['players'][1]['id'] == sender_id else 2
-        opponent_data = game['players'][3 - proposer_num]
+        proposer_num, players = game.roles[sender_id], game.players
+        opponent_data = players[3 - proposer_num]
 
         if opponent_data.get('is_ai'):
-            if random.random() > 0.5:
-                p1, p2 = game["players"][1], game["players"][2]
+            if random.getrandbits(1):  # AI 以一半概率接受求和
+                p1, p2 = players[1], players[2]
                 msg = f"AI接受了您的求和！游戏平局结束。"
-                await self._broadcast_final_message(game, msg, None)
+                self._broadcast_final_message(game, msg, None)
                 self._update_draw_rankings(p1['id'], p1['name'], p2['id'], p2['name']);
                 self._cleanup_game_state(game_id)
             else:
@@ -674,9 +1104,9 @@ class WuziqiPlugin(Star):
             event.stop_event()
             return
 
-        self.peace_requests[game_id] = {"proposer": sender_id,
-                                        "timeout_task": asyncio.create_task(self._request_timeout(game_id, "peace"))}
-        proposer_name = game['players'][proposer_num]['name']
+        self.peace_requests[game_id] = PendingRequest(sender_id, proposer_num, asyncio.get_running_loop().call_later(
+            self.request_timeout_duration, self._expire_request, game_id, "peace"))
+        proposer_name = players[proposer_num]['name']
         opponent_context = opponent_data.get("context")
         opponent_id = opponent_data.get("id")
 
@@ -689,59 +1119,32 @@ class WuziqiPlugin(Star):
 
     @filter.command("接受求和")
     async def handle_accept_peace(self, event: AstrMessageEvent):
-        sender_id = event.get_sender_id()
-        game = self._get_game_by_player(sender_id)
-        if not game or game['id'] not in self.peace_requests:
-            event.stop_event()
-            return
-        request = self.peace_requests[game['id']]
-        if request['proposer'] == sender_id:
-            event.stop_event()
-            return
-
-        request['timeout_task'].cancel()
-        del self.peace_requests[game['id']]
-        p1, p2 = game["players"][1], game["players"][2]
+        game, request = self._claim_request(event, self.peace_requests)
+        if not request: return
+        p1, p2 = game.players[1], game.players[2]
         msg = f"{event.get_sender_name()} 同意了求和请求！游戏平局结束。"
-        await self._broadcast_final_message(game, msg, None)
+        self._broadcast_final_message(game, msg, None)
         self._update_draw_rankings(p1['id'], p1['name'], p2['id'], p2['name'])
-        self._cleanup_game_state(game['id'])
+        self._cleanup_game_state(game.id)
         event.stop_event()
 
     @filter.command("拒绝求和")
     async def handle_reject_peace(self, event: AstrMessageEvent):
-        sender_id = event.get_sender_id()
-        game = self._get_game_by_player(sender_id)
-        if not game or game['id'] not in self.peace_requests:
-            event.stop_event()
-            return
-        request = self.peace_requests[game['id']]
-        if request['proposer'] == sender_id:
-            event.stop_event()
-            return
-
-        request['timeout_task'].cancel()
-        del self.peace_requests[game['id']]
-        await self._broadcast_final_message(game, f"{event.get_sender_name()} 拒绝了求和请求，游戏继续。", None)
-        event.stop_event()
+        self._reject_request(event, self.peace_requests, "求和")
 
     @filter.command("认输")
     async def handle_surrender(self, event: AstrMessageEvent):
         sender_id = event.get_sender_id()
-        game = self._get_game_by_player(sender_id)
-        if not game or game["status"] != "active":
-            event.stop_event()
-            return
-        loser_num = 1 if game["players"][1]["id"] == sender_id else 2
-
+        game = self._get_action_game(event)
+        if not game: return
+        loser_num, players = game.roles[sender_id], game.players
         winner_num = 3 - loser_num
-        loser = game["players"][loser_num]
-        winner = game["players"][winner_num]
+        loser, winner = players[loser_num], players[winner_num]
 
-        msg = f"{loser['name']} ({'黑棋' if loser_num == 1 else '白棋'}) 认输！\n胜者是: {winner['name']} ({'黑棋' if winner_num == 1 else '白棋'})"
-        await self._broadcast_final_message(game, msg, None)
+        msg = f"{loser['name']} ({_STONE_LABELS[loser_num]}) 认输！\n胜者是: {winner['name']} ({_STONE_LABELS[winner_num]})"
+        self._broadcast_final_message(game, msg, None)
         self._update_rankings(winner['id'], winner['name'], loser['id'], loser['name'])
-        self._cleanup_game_state(game['id'])
+        self._cleanup_game_state(game.id)
         event.stop_event()
 
     @filter.command("结束下棋")
@@ -757,20 +1160,20 @@ class WuziqiPlugin(Star):
             event.stop_event()
             return
 
-        if game["status"] != "active":
+        if game.status != "active":
             yield event.plain_result("当前没有正在进行的对局可供结束。")
             event.stop_event()
             return
 
-        is_ai_game = game['players'][1].get('is_ai', False) or \
-                     game['players'][2].get('is_ai', False)
+        is_ai_game = game.players[1].get('is_ai', False) or \
+                     game.players[2].get('is_ai', False)
 
         if not is_ai_game:
             yield event.plain_result("玩家对战中无法使用此命令，请使用 /认输 或与对方协商 /求和。")
             event.stop_event()
             return
 
-        game_id = game['id']
+        game_id = game.id
 
         self._cleanup_game_state(game_id)
 
@@ -800,25 +1203,7 @@ class WuziqiPlugin(Star):
 
     @filter.command("五子棋帮助")
     async def show_help(self, event: AstrMessageEvent):
-        yield event.plain_result(
-            "🎲 五子棋游戏帮助（完整功能版） 🎲\n\n"
-            "【核心指令】\n"
-            "- /五子棋: 创建新游戏，并发布到游戏大厅。\n"
-            "- /取消五子棋: 游戏未开始时，发起者可取消游戏。\n"
-            "- /游戏大厅: 查看所有等待中的游戏。\n"
-            "- /加入五子棋 <ID>: 输入ID加入游戏。\n"
-            "- /人机对战: 直接开始或加入人机对战。\n"
-            "- 直接发坐标(如H7): 在指定位置落子。\n\n"
-            "【游戏内指令】\n"
-            "- /查看棋局: 查看当前棋盘。\n"
-            "- /悔棋, /接受悔棋, /拒绝悔棋\n"
-            "- /求和, /接受求和, /拒绝求和\n"
-            "- /认输: 结束游戏并判负。\n"
-            "- /结束下棋: [仅限人机对战] 放弃对局（无胜负记录）。\n\n"
-            "【其他】\n"
-            "- /我的战绩: 查询战绩。\n"
-            "- /五子棋排行榜: 查看排行榜"
-        )
+        yield event.plain_result(_HELP_TEXT)
         event.stop_event()
 
     @filter.command("五子棋排行榜")
@@ -827,9 +1212,9 @@ class WuziqiPlugin(Star):
             yield event.plain_result("暂无玩家上榜。")
             event.stop_event()
             return
-        image_path = self._draw_rankings_image()
-        if image_path:
-            yield event.image_result(image_path)
+        rankings_image = await asyncio.to_thread(self._draw_rankings_image)
+        if rankings_image:
+            yield event.chain_result([Image.fromBytes(rankings_image)])
         else:
             yield event.plain_result("排行榜为空或生成图片失败。")
         event.stop_event()
@@ -842,25 +1227,30 @@ class WuziqiPlugin(Star):
             event.stop_event()
             return
         data = self.rankings[sender_id]
-        wins, losses, draws = data.get("wins", 0), data.get("losses", 0), data.get("draws", 0)
-        total = wins + losses + draws
-        win_rate = (wins / total * 100) if total > 0 else 0
         yield event.plain_result(
-            f"您的五子棋战绩 [{data['name']}]：\n胜：{wins} | 负：{losses} | 平：{draws}\n总对局：{total} | 胜率：{win_rate:.2f}%")
+            f"您的五子棋战绩 [{data['name']}]：\n胜：{data['wins']} | 负：{data['losses']} | 平：{data['draws']}\n"
+            f"总对局：{data['total']} | 胜率：{data['win_rate']:.2f}%")
         event.stop_event()
 
 
     async def terminate(self):
-        for task in self.wait_tasks.values(): task.cancel()
-        for req in self.peace_requests.values():
-            if "timeout_task" in req: req["timeout_task"].cancel()
-        for req in self.undo_requests.values():
-            if "timeout_task" in req: req["timeout_task"].cancel()
+        # 加入超时计时与延迟保存直接取消；已排队的对局结果等广播先等其发完，超时仍未完成的再取消。
+        # 等所有任务真正退出后再做最后一次写盘，避免与正在进行的保存交错
+        tasks = list(self.wait_tasks.values())
+        if self._save_task: tasks.append(self._save_task)
+        for task in tasks: task.cancel()
+        if self._send_tasks:
+            _, pending = await asyncio.wait(list(self._send_tasks), timeout=self.send_drain_timeout)
+            for task in pending: task.cancel()
+            tasks.extend(pending)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # 排队中的 AI 搜索直接取消，正在进行的一次搜索在后台自然结束，不阻塞卸载
+        self._ai_executor.shutdown(wait=False, cancel_futures=True)
+        for request_map in (self.peace_requests, self.undo_requests):
+            for game_id in list(request_map): self._close_request(request_map, game_id)
         self.games.clear()
+        self.player_to_game.clear()
         self.wait_tasks.clear()
-        self.peace_requests.clear()
-        self.undo_requests.clear()
-        self.undo_stats.clear()
         self.lobby.clear()  # 清理大厅
-        self._save_rankings()
+        self._save_rankings(compact=True)
         logger.info("五子棋插件已卸载，所有游戏和任务已清理。")
\ No newline at end of file